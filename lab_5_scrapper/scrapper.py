@@ -1,24 +1,94 @@
 """
 Crawler implementation.
 """
-# pylint: disable=too-many-arguments, too-many-instance-attributes, unused-import, undefined-variable
+# pylint: disable=too-many-arguments, too-many-instance-attributes, unused-import, undefined-variable, too-few-public-methods
+import asyncio
 import datetime
 import json
+import os
 import pathlib
 import re
 import shutil
+import ssl
+import threading
+from collections import deque
+from concurrent.futures import as_completed, ThreadPoolExecutor
 from random import randrange
 from time import sleep
-from typing import Pattern, Union
+from typing import Any, Pattern, Union
+from urllib.parse import urlparse
 
+import aiohttp
+import certifi
+import orjson
 import requests
-from bs4 import BeautifulSoup
+import requests_cache
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder._lxml import LXMLTreeBuilder
+from lxml import etree
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from core_utils.article.article import Article
 from core_utils.article.io import to_meta, to_raw
 from core_utils.config_dto import ConfigDTO
 from core_utils.constants import ASSETS_PATH, CRAWLER_CONFIG_PATH
 
+_SEED_URL_PATTERN = re.compile(r"https?://(?:www\.)?scientificrussia\.ru/news")
+_AUTHOR_LABEL_PATTERN = re.compile(r'^\s*\S+\s*')
+
+_CARD_STRAINER = SoupStrainer(class_="card-body")
+
+_XP_ARTICLE_BODY = etree.XPath('//*[@itemprop="articleBody"]')
+_XP_PARAGRAPHS = etree.XPath('.//p')
+_XP_AUTHORS = etree.XPath(
+    '//*[@class="props distant"]'
+    '//*[contains(concat(" ", normalize-space(@class), " "), " author ")]')
+_XP_TITLE = etree.XPath('string(//*[@itemprop="name headline"])')
+_XP_DATE = etree.XPath('string(//time)')
+_XP_KEYWORDS = etree.XPath('//*[@itemprop="keywords"]')
+
+
+class _SSLContextAdapter(HTTPAdapter):
+    """
+    Transport adapter that shares one preloaded SSLContext across the pool.
+    """
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs: Any) -> None:
+        """
+        Initialize an instance of the _SSLContextAdapter class.
+
+        Args:
+            ssl_context (ssl.SSLContext): Context reused by every connection
+            **kwargs (Any): Keyword arguments passed through to HTTPAdapter
+        """
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Build the urllib3 pool manager around the shared context.
+
+        Args:
+            *args (Any): Positional arguments passed through to HTTPAdapter
+            **kwargs (Any): Keyword arguments passed through to HTTPAdapter
+        """
+        kwargs['ssl_context'] = self._ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+
+_SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+_RETRY_STRATEGY = Retry(total=3, backoff_factor=0.3,
+                        status_forcelist=[429, 500, 502, 503, 504])
+
+_SESSION = requests_cache.CachedSession(
+    str(ASSETS_PATH.parent / 'http_cache.sqlite'),
+    expire_after=3600, allowable_methods=['GET'], stale_if_error=True)
+_SESSION.mount('https://', _SSLContextAdapter(
+    _SSL_CONTEXT, pool_connections=4, pool_maxsize=16, max_retries=_RETRY_STRATEGY))
+_SESSION.headers['Accept-Encoding'] = 'gzip, br'
+
 
 class IncorrectSeedURLError(Exception):
     """
@@ -86,6 +156,19 @@ class Config:
         self._should_verify_certificate = self.config_dto.should_verify_certificate
         self._headless_mode = self.config_dto.headless_mode
 
+        _SESSION.headers.update(self._headers)
+        if not self._should_verify_certificate:
+            insecure_context = ssl.create_default_context()
+            insecure_context.check_hostname = False
+            insecure_context.verify_mode = ssl.CERT_NONE
+            _SESSION.mount('https://', _SSLContextAdapter(
+                insecure_context, pool_connections=4, pool_maxsize=16,
+                max_retries=_RETRY_STRATEGY))
+        self._request_kwargs = {
+            'timeout': self._timeout,
+            'verify': self._should_verify_certificate
+        }
+
     def _extract_config_content(self) -> ConfigDTO:
         """
         Get config values.
@@ -106,7 +189,7 @@ class Config:
             raise IncorrectSeedURLError
 
         for seed_url in self.config_dto.seed_urls:
-            if not re.match(r"https?://(www.)?scientificrussia\.ru/news", seed_url):
+            if not _SEED_URL_PATTERN.match(seed_url):
                 raise IncorrectSeedURLError
 
         if not isinstance(self.config_dto.total_articles, int) or \
@@ -183,6 +266,15 @@ class Config:
         """
         return self._should_verify_certificate
 
+    def get_request_kwargs(self) -> dict:
+        """
+        Retrieve keyword arguments prebuilt for session requests.
+
+        Returns:
+            dict: Keyword arguments for session requests
+        """
+        return self._request_kwargs
+
     def get_headless_mode(self) -> bool:
         """
         Retrieve whether to use headless mode.
@@ -193,20 +285,132 @@ class Config:
         return self._headless_mode
 
 
-def make_request(url: str, config: Config) -> requests.models.Response:
+def _soup(text: str, strainer: Union[SoupStrainer, None] = None) -> BeautifulSoup:
+    """
+    Build a BeautifulSoup tree over the lxml builder.
+
+    Args:
+        text (str): Page content
+        strainer (Union[SoupStrainer, None]): Optional subtree filter
+
+    Returns:
+        BeautifulSoup: Parsed page tree
+    """
+    return BeautifulSoup(text, builder=LXMLTreeBuilder, parse_only=strainer)
+
+
+class _HostRateLimiter:
+    """
+    Space out requests per host so different hosts are fetched in parallel.
+    """
+
+    def __init__(self, min_interval: float) -> None:
+        """
+        Initialize an instance of the _HostRateLimiter class.
+
+        Args:
+            min_interval (float): Minimal delay between requests to one host
+        """
+        self._min_interval = min_interval
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last_fetch: dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        """
+        Sleep until the url's host may be requested again.
+
+        Args:
+            url (str): Site url
+        """
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            last_fetch = self._last_fetch.get(host)
+            if last_fetch is not None:
+                elapsed = loop.time() - last_fetch
+                if elapsed < self._min_interval:
+                    await asyncio.sleep(self._min_interval - elapsed)
+            self._last_fetch[host] = loop.time()
+
+
+async def _fetch(session: aiohttp.ClientSession, url: str, config: Config,
+                 semaphore: asyncio.Semaphore, limiter: _HostRateLimiter) -> str:
+    """
+    Download one page within the concurrency limit.
+
+    Args:
+        session (aiohttp.ClientSession): Shared client session
+        url (str): Site url
+        config (Config): Configuration
+        semaphore (asyncio.Semaphore): Limit on simultaneous downloads
+        limiter (_HostRateLimiter): Politeness delay shared per host
+
+    Returns:
+        str: Page content or empty string if the request failed
+    """
+    async with semaphore:
+        await limiter.wait(url)
+        try:
+            async with session.get(url, ssl=config.get_verify_certificate()) as response:
+                if response.status != 200:
+                    return ''
+                return await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return ''
+
+
+async def _fetch_all(urls: list[str], config: Config) -> list[str]:
+    """
+    Download all pages concurrently with one client session.
+
+    Args:
+        urls (list[str]): Site urls
+        config (Config): Configuration
+
+    Returns:
+        list[str]: Page contents in the order of urls
+    """
+    semaphore = asyncio.Semaphore(10)
+    limiter = _HostRateLimiter(min_interval=1.0)
+    connector = aiohttp.TCPConnector(limit=10, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=config.get_timeout())
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     headers=config.get_headers()) as session:
+        return await asyncio.gather(*[_fetch(session, url, config, semaphore, limiter)
+                                      for url in urls])
+
+
+def make_request(url: str, config: Config, stream: bool = False) -> requests.models.Response:
     """
     Deliver a response from a request with given configuration.
 
     Args:
         url (str): Site url
         config (Config): Configuration
+        stream (bool): Whether to defer downloading the response body
 
     Returns:
         requests.models.Response: A response from a request
     """
-    sleep(randrange(2))
-    return requests.get(url=url, headers=config.get_headers(),
-                        timeout=config.get_timeout(), verify=config.get_verify_certificate())
+    if not _SESSION.cache.contains(url=url):
+        sleep(randrange(2))
+    return _SESSION.get(url=url, stream=stream, **config.get_request_kwargs())
+
+
+def _header_charset(response: requests.models.Response) -> Union[str, None]:
+    """
+    Extract the charset declared in the Content-Type header.
+
+    Args:
+        response (requests.models.Response): Response whose headers to inspect
+
+    Returns:
+        Union[str, None]: Declared charset, or None if the header names none
+    """
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        return None
+    return requests.utils.get_encoding_from_headers(response.headers)
 
 
 class Crawler:
@@ -237,25 +441,30 @@ class Crawler:
         Returns:
             str: Url from HTML
         """
-        return self.url_pattern + str(article_bs.find('a').get('href')) \
-            if article_bs.find('a').get('href') else ''
+        link = article_bs.find('a')
+        href = link.get('href') if link else None
+        return self.url_pattern + str(href) if href else ''
 
     def find_articles(self) -> None:
         """
         Find articles.
         """
-        for url in self.get_search_urls():
-            response = make_request(url, self.config)
+        num_articles = self.config.get_num_articles()
+        seen = set(self.urls)
 
-            if not response.ok:
+        pages = asyncio.run(_fetch_all(self.get_search_urls(), self.config))
+        for page in pages:
+            if not page:
                 continue
 
-            soup = BeautifulSoup(response.text, 'lxml')
+            soup = _soup(page, _CARD_STRAINER)
             for div in soup.find(class_="card-body").find_all("div", {"class": "title"}):
-                if self._extract_url(div) and self._extract_url(div) not in self.urls:
-                    self.urls.append(self._extract_url(div))
+                url = self._extract_url(div)
+                if url and url not in seen:
+                    seen.add(url)
+                    self.urls.append(url)
 
-                if len(self.urls) >= self.config.get_num_articles():
+                if len(self.urls) >= num_articles:
                     return
 
     def get_search_urls(self) -> list:
@@ -291,49 +500,43 @@ class HTMLParser:
         self.config = config
         self.article = Article(self.full_url, self.article_id)
 
-    def _fill_article_with_text(self, article_soup: BeautifulSoup) -> None:
+    def _fill_article_with_text(self, article_tree: lxml_html.HtmlElement) -> None:
         """
         Find text of article.
 
         Args:
-            article_soup (bs4.BeautifulSoup): BeautifulSoup instance
+            article_tree (lxml.html.HtmlElement): Root of the article page tree
         """
-        text = article_soup.find(itemprop="articleBody")
-
-        paragraphs = text.find_all('p')
-        texts = [p.text for p in paragraphs]
+        text = _XP_ARTICLE_BODY(article_tree)[0]
 
-        self.article.text = '\n'.join(texts)
+        self.article.text = '\n'.join([p.text_content() for p in _XP_PARAGRAPHS(text)])
 
-    def _fill_article_with_meta_information(self, article_soup: BeautifulSoup) -> None:
+    def _fill_article_with_meta_information(self, article_tree: lxml_html.HtmlElement) -> None:
         """
         Find meta information of article.
 
         Args:
-            article_soup (bs4.BeautifulSoup): BeautifulSoup instance
+            article_tree (lxml.html.HtmlElement): Root of the article page tree
         """
-        author = article_soup.find(class_="props distant").find_all(class_='author')
+        author = _XP_AUTHORS(article_tree)
 
         if author:
-            self.article.author = [' '.join(i.text.split()[1:]) for i in author]
+            self.article.author = [_AUTHOR_LABEL_PATTERN.sub('', i.text_content()).strip()
+                                   for i in author]
         else:
             self.article.author = ["NOT FOUND"]
 
-        title = article_soup.find(itemprop="name headline")
+        title = _XP_TITLE(article_tree)
 
         if title:
-            self.article.title = title.text.strip()
+            self.article.title = title.strip()
 
-        date = article_soup.find('time').text
+        date = _XP_DATE(article_tree)
         self.article.date = self.unify_date_format(date)
 
-        list_of_keywords = []
-        keywords = article_soup.find_all(itemprop="keywords")
-
-        for i in keywords:
-            list_of_keywords.append(i.text)
+        keywords = _XP_KEYWORDS(article_tree)
 
-        self.article.topics = list_of_keywords
+        self.article.topics = [keyword.text_content() for keyword in keywords]
 
     def unify_date_format(self, date_str: str) -> datetime.datetime:
         """
@@ -354,12 +557,18 @@ class HTMLParser:
         Returns:
             Union[Article, bool, list]: Article instance
         """
-        response = make_request(self.full_url, self.config)
+        response = make_request(self.full_url, self.config, stream=True)
 
-        if response.ok:
-            article_bs = BeautifulSoup(response.text, 'lxml')
-            self._fill_article_with_text(article_bs)
-            self._fill_article_with_meta_information(article_bs)
+        if not response.ok:
+            response.close()
+            return self.article
+
+        parser = lxml_html.HTMLParser(encoding=_header_charset(response))
+        for chunk in response.iter_content(chunk_size=65536):
+            parser.feed(chunk)
+        article_tree = parser.close()
+        self._fill_article_with_text(article_tree)
+        self._fill_article_with_meta_information(article_tree)
         return self.article
 
 
@@ -371,7 +580,10 @@ def prepare_environment(base_path: Union[pathlib.Path, str]) -> None:
         base_path (Union[pathlib.Path, str]): Path where articles stores
     """
     if base_path.exists():
-        shutil.rmtree(base_path)
+        outdated_path = base_path.with_name(f'{base_path.name}.old-{os.getpid()}')
+        base_path.rename(outdated_path)
+        threading.Thread(target=shutil.rmtree, args=(outdated_path,),
+                         kwargs={'ignore_errors': True}, daemon=True).start()
     base_path.mkdir(parents=True)
 
 
@@ -394,6 +606,10 @@ class CrawlerRecursive(Crawler):
         self.visited_urls = []
         self.created_articles = []
         self.get_info()
+        self._urls_set = set(self.urls)
+        self._possible_set = set(self.possible_urls)
+        self._visited_set = set(self.visited_urls)
+        self._pages_since_save = 0
 
     def get_info(self) -> None:
         """
@@ -425,51 +641,60 @@ class CrawlerRecursive(Crawler):
         if not ASSETS_PATH.exists():
             ASSETS_PATH.mkdir(parents=True)
 
-        with open(self.path, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4)
+        self.path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        self._pages_since_save = 0
 
     def find_articles(self) -> None:
         """
         Find articles.
         """
-        url = self.possible_urls[len(self.visited_urls)]
+        num_articles = self.config.get_num_articles()
+        pending = deque(url for url in self.possible_urls if url not in self._visited_set)
+
+        while pending and len(self.urls) < num_articles:
+            url = pending.popleft()
 
-        if url not in self.visited_urls:
+            self._visited_set.add(url)
             self.visited_urls.append(url)
 
-        response = make_request(url, self.config)
+            response = make_request(url, self.config)
 
-        if not response.ok:
-            return
+            if not response.ok:
+                continue
 
-        article_bs = BeautifulSoup(response.text, 'lxml')
+            article_bs = _soup(response.text)
 
-        links = article_bs.find_all('a')
-        articles = []
+            links = article_bs.find_all('a')
 
-        for div in article_bs.find(class_="card-body").find_all("div", {"class": "title"}):
-            articles.append(self._extract_url(div))
+            articles = {self._extract_url(div) for div in
+                        article_bs.find(class_="card-body").find_all("div", {"class": "title"})}
 
-        for i in links:
-            if not i.get('href'):
-                continue
+            for i in links:
+                href = i.get('href')
+                if not href:
+                    continue
 
-            if 'https' in i.get('href'):
-                link_url = i.get('href')
-            else:
-                link_url = self.url_pattern + i.get('href')
+                if 'https' in href:
+                    link_url = href
+                else:
+                    link_url = self.url_pattern + href
 
-            if link_url not in self.possible_urls:
-                self.possible_urls.append(link_url)
-            if link_url not in self.urls and link_url in articles:
-                self.urls.append(link_url)
+                if link_url not in self._possible_set:
+                    self._possible_set.add(link_url)
+                    self.possible_urls.append(link_url)
+                    pending.append(link_url)
+                if link_url not in self._urls_set and link_url in articles:
+                    self._urls_set.add(link_url)
+                    self.urls.append(link_url)
 
-            self.save_info()
+                if len(self.urls) >= num_articles:
+                    break
 
-            if len(self.urls) >= self.config.get_num_articles():
-                return
+            self._pages_since_save += 1
+            if self._pages_since_save >= 10:
+                self.save_info()
 
-        self.find_articles()
+        self.save_info()
 
 
 def main() -> None:
@@ -481,12 +706,14 @@ def main() -> None:
     crawler.find_articles()
     prepare_environment(ASSETS_PATH)
 
-    for id_num, url in enumerate(crawler.urls, 1):
-        parser = HTMLParser(url, id_num, conf)
-        article = parser.parse()
-        if isinstance(article, Article):
-            to_raw(article)
-            to_meta(article)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(HTMLParser(url, id_num, conf).parse)
+                   for id_num, url in enumerate(crawler.urls, 1)]
+        for future in as_completed(futures):
+            article = future.result()
+            if isinstance(article, Article):
+                to_raw(article)
+                to_meta(article)
 
 
 def recursive_main() -> None: